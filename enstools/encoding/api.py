@@ -5,6 +5,7 @@ Access point to have access to all utilities defined in enstools-encoding
 """
 
 # pylint: disable= unused-import
-from .definitions import lossy_compressors, lossy_compression_modes, lossy_compressors_and_modes, lossless_backends
+from .definitions import lossy_compressors, lossy_compression_modes, lossy_compressors_and_modes, lossless_backends, \
+    lossless_shuffles, set_blosc_nthreads
 from .variable_encoding import VariableEncoding, LossyEncoding, LosslessEncoding, NullEncoding, Encoding
 from .dataset_encoding import DatasetEncoding
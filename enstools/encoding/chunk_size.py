@@ -1,7 +1,11 @@
 # Using a module file to store the desired chunk size.
 
-# Chunk size used to save files to disk
-chunk_size = "10MB"
+# Chunk size used to save files to disk.
+# Small chunks increase the HDF5 B-tree overhead and reduce the compression ratio of the lossy compressors.
+chunk_size = "16MB"
+
+# Maximum number of chunks along a single dimension, to bound the number of chunks of huge datasets
+max_chunks_per_dim = 8192
 
 # Chunk size used for the analysis
 analysis_chunk_size = "100KB"
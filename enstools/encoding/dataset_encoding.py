@@ -9,35 +9,49 @@ Functions:
   compression entries to a single-line specification string.
 - parse_full_specification(spec): Parses a full compression specification and returns a
   dictionary of variable encodings.
+- parse_specification_dictionary(compression_dictionary): Same as parse_full_specification for a
+  dictionary with the specification of each variable.
 - is_a_valid_dataset_compression_specification(specification): Checks if a compression
   specification is valid for a dataset.
 - find_chunk_sizes(data_array, chunk_size): Determines chunk sizes for each dimension of a
   data array based on a desired chunk size.
+- chunk_sizes_in_dim_order(dims, shape, chunk_size): Same as find_chunk_sizes but returns a tuple
+  following the order of the dimensions.
+- netcdf4_chunk_sizes(dims, shape, itemsize, target_bytes, unlimited_dims): Alternative chunking
+  heuristic in the style of netCDF4, halving the largest chunk dimension until the target size is met.
+- netcdf4_chunk_strategy(data_array, target_bytes, unlimited_dims): netcdf4_chunk_sizes as a chunk_strategy for
+  DatasetEncoding, with a 1MB target and a chunk size of 1 along time and the given unlimited dimensions.
 
 Class:
 - DatasetEncoding: Encapsulates compression specification parameters for a full dataset.
   Provides methods to generate encodings and add metadata.
 
 """
+from __future__ import annotations
 
+import functools
 import os
 import re
-from copy import deepcopy
 from pathlib import Path
-from typing import Hashable, Union, Dict
+from typing import TYPE_CHECKING, Callable, Hashable, Optional, Union, Dict
 import math
 
-import numpy as np
-import xarray
-import yaml
-
 import enstools.encoding.chunk_size
 from . import rules
 from .errors import InvalidCompressionSpecification
-from .variable_encoding import _Mapping, parse_variable_specification, Encoding, \
+from .variable_encoding import _Mapping, _parse_variable_specification, Encoding, \
     NullEncoding
 from .rules import VARIABLE_SEPARATOR, VARIABLE_NAME_SEPARATOR, \
-    DATA_DEFAULT_LABEL, DATA_DEFAULT_VALUE, COORD_LABEL, COORD_DEFAULT_VALUE
+    DATA_DEFAULT_LABEL, DATA_DEFAULT_VALUE, COORD_LABEL, COORD_DEFAULT_VALUE, \
+    NULL_SPECIFICATIONS
+
+# xarray and yaml are heavy to import, yaml is imported only when reading a specification file.
+if TYPE_CHECKING:
+    import xarray
+
+# Matches the digits (optionally with a decimal part) and the unit of a size string (e.g. '5MB')
+_SIZE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([A-Z]+)?')
+_SIZE_NAME_DICT = {'B': 0, 'KB': 1, 'MB': 2, 'GB': 3, 'TB': 4, 'PB': 5, 'EB': 6, 'ZB': 7, 'YB': 8}
 
 
 def convert_size(size_bytes):
@@ -60,8 +74,10 @@ def convert_size(size_bytes):
         return "0B"
 
     size_units = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    magnitude = int(math.floor(math.log(size_bytes, 1024)))
-    factor = math.pow(1024, magnitude)
+    # Each unit is 2**10 times the previous one, so the bit length gives the magnitude directly.
+    # Sizes below one byte have a bit length of 0, clamp them to bytes.
+    magnitude = min(max(0, (int(size_bytes).bit_length() - 1) // 10), len(size_units) - 1)
+    factor = 1 << (magnitude * 10)
     size = round(size_bytes / factor, 2)
     return f"{prefix}{size}{size_units[magnitude]}"
 
@@ -77,18 +93,13 @@ def convert_to_bytes(size_string):
     int: The number of bytes.
     """
 
-    size_string = size_string.upper()
-    digits = re.match(r'\d+(?:\.\d+)?', size_string)  # matches digits and optionally a dot followed by more digits
-    if digits:
-        digits = digits.group()  # get the matched digits
-    else:
+    match = _SIZE_RE.fullmatch(size_string.upper().strip())
+    if not match:
         raise ValueError(f"Invalid size string: {size_string}")
-    unit = size_string.replace(digits, "")
-    size_name_dict = {'B': 0, 'KB': 1, 'MB': 2, 'GB': 3, 'TB': 4, 'PB': 5, 'EB': 6, 'ZB': 7, 'YB': 8}
-    if unit in size_name_dict:
-        size_bytes = float(digits) * np.power(1024, size_name_dict[unit])
-    else:
+    digits, unit = match.group(1), match.group(2) or "B"
+    if unit not in _SIZE_NAME_DICT:
         raise ValueError(f"Invalid size string: {size_string}")
+    size_bytes = float(digits) * (1 << (10 * _SIZE_NAME_DICT[unit]))
     return int(size_bytes)
 
 
@@ -113,21 +124,46 @@ def parse_full_specification(spec: Union[str, None]) -> Dict[str, Encoding]:
     Raises:
         InvalidCompressionSpecification: If a variable has multiple definitions in the specification.
 
+    Note:
+        - The parsing is cached for identical specifications, each call gets its own copy of the encodings.
     """
+    spec = _normalize_specification(spec)
+    return {var_name: encoding.clone() for var_name, encoding in _parse_full_specification(spec).items()}
+
+
+def _is_a_specification_file(compression: str) -> bool:
+    """
+    Checks if a compression string refers to an existing file.
+    The bare keywords are not looked up in the file system, any other string can be a path (e.g. '/tmp/run,1/a.yaml').
+    """
+    if compression in ("lossless", "lossy") or compression in NULL_SPECIFICATIONS:
+        return False
+    return os.path.exists(compression)
+
+
+def _normalize_specification(spec: Union[str, None]) -> str:
+    """
+    Normalize the specification so that equivalent specifications share the same cache entry.
+    """
+    return "None" if spec is None else spec.strip()
 
-    result = {}
 
-    if spec is None:
-        spec = "None"
+@functools.lru_cache(maxsize=128)
+def _parse_full_specification(spec: str) -> Dict[str, Encoding]:
+    """
+    Cached implementation of parse_full_specification.
+    The returned dictionary is shared between calls and must not be modified.
+    """
+
+    result = {}
 
     parts = spec.split(VARIABLE_SEPARATOR)
     for part in parts:
         # For each part, check if there's a variable name.
-        # If there's a variable name, split the name and the specification
-        if VARIABLE_NAME_SEPARATOR in part:
-            var_name, var_spec = part.split(VARIABLE_NAME_SEPARATOR)
+        # If there's a variable name, split the name and the specification in a single pass.
+        var_name, separator, var_spec = part.partition(VARIABLE_NAME_SEPARATOR)
         # Otherwise, it corresponds to the default.
-        else:
+        if not separator:
             var_name = DATA_DEFAULT_LABEL
             var_spec = part
 
@@ -136,18 +172,59 @@ def parse_full_specification(spec: Union[str, None]) -> Dict[str, Encoding]:
             raise InvalidCompressionSpecification(f"Variable {var_name} has multiple definitions."
                                                   f"")
         # Parse the variable specification
-        result[var_name] = parse_variable_specification(var_spec)
+        result[var_name] = _parse_variable_specification(var_spec)
+
+    return _complete_variable_encodings(result)
+
+
+def parse_specification_dictionary(compression_dictionary: Dict[str, str]) -> Dict[str, Encoding]:
+    """
+    Same as parse_full_specification but for a dictionary mapping variable names to their specification,
+    without going through a single specification string.
+
+    Args:
+        compression_dictionary (Dict[str, str]): The specification of each variable.
 
+    Returns:
+        Dict[str, Encoding]: A dictionary mapping variable names to their corresponding encodings.
+
+    Raises:
+        InvalidCompressionSpecification: If compression_dictionary is not a dictionary or it is empty.
+    """
+    if not isinstance(compression_dictionary, dict):
+        raise InvalidCompressionSpecification(
+            f"The compression specification should be a dictionary. It is {type(compression_dictionary)!r}.")
+    # An empty dictionary is as invalid as an empty specification string.
+    if not compression_dictionary:
+        raise InvalidCompressionSpecification("Invalid specification ''")
+    entries = tuple((str(var_name), str(var_spec)) for var_name, var_spec in compression_dictionary.items())
+    return {var_name: encoding.clone() for var_name, encoding in _parse_specification_entries(entries).items()}
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_specification_entries(entries: tuple) -> Dict[str, Encoding]:
+    """
+    Cached implementation of parse_specification_dictionary.
+    The returned dictionary is shared between calls and must not be modified.
+    """
+    result = {var_name: _parse_variable_specification(var_spec) for var_name, var_spec in entries}
+    return _complete_variable_encodings(result)
+
+
+def _complete_variable_encodings(result: Dict[str, Encoding]) -> Dict[str, Encoding]:
+    """
+    Adds the default encodings for data and coordinates when they are missing and checks the validity of all of them.
+    """
     # In case values for default and coordinates haven't been provided, use the default values.
     if DATA_DEFAULT_LABEL not in result:
-        result[DATA_DEFAULT_LABEL] = parse_variable_specification(DATA_DEFAULT_VALUE)
+        result[DATA_DEFAULT_LABEL] = _default_data_encoding()
 
     if COORD_LABEL not in result:
         # If the default is a NullSpecification, we'll use the same for the coordinates
         if isinstance(result[DATA_DEFAULT_LABEL], NullEncoding):
             result[COORD_LABEL] = result[DATA_DEFAULT_LABEL]
         else:
-            result[COORD_LABEL] = parse_variable_specification(COORD_DEFAULT_VALUE)
+            result[COORD_LABEL] = _default_coordinates_encoding()
 
     # For each specification, check that the specifications are valid.
     for _, _spec in result.items():
@@ -156,20 +233,70 @@ def parse_full_specification(spec: Union[str, None]) -> Dict[str, Encoding]:
     return result
 
 
+@functools.lru_cache(maxsize=None)
+def _default_data_encoding() -> Encoding:
+    """
+    Encoding used for the data variables when the specification doesn't provide a default, parsed only once.
+    """
+    return _parse_variable_specification(DATA_DEFAULT_VALUE)
+
+
+@functools.lru_cache(maxsize=None)
+def _default_coordinates_encoding() -> Encoding:
+    """
+    Encoding used for the coordinates when the specification doesn't provide one, parsed only once.
+    """
+    return _parse_variable_specification(COORD_DEFAULT_VALUE)
+
+
+def _load_yaml_file(path: str) -> dict:
+    """
+    Loads a yaml file with the LibYAML based loader when available.
+    The file is read on every call: file timestamps can be too coarse (e.g. on NFS) to notice that it changed.
+    Parsing the specifications it contains is cached anyway.
+
+    Raises:
+        InvalidCompressionSpecification: If the file doesn't contain a dictionary (e.g. it is empty).
+    """
+    import yaml  # pylint: disable=import-outside-toplevel
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, "r", encoding="utf-8") as stream:
+        content = yaml.load(stream, Loader=loader)
+    if not isinstance(content, dict):
+        raise InvalidCompressionSpecification(
+            f"The specification file {path!r} should contain a dictionary. It contains {type(content)!r}.")
+    return content
+
+
 class DatasetEncoding(_Mapping):
     """
     Class to encapsulate compression specification parameters corresponding to a full dataset.
     The kind of encoding that xarray expects is a mapping between the variables and their corresponding h5py encoding.
+
+    The chunk sizes of each variable can be customized providing a chunk_strategy, a function that receives a
+    data array and returns its chunk sizes following the order of its dimensions, i.e:
+
+    >>> DatasetEncoding(dataset, "lossless",
+    ...                 chunk_strategy=lambda da: tuple(1 if d == "time" else s for d, s in zip(da.dims, da.shape)))
     """
 
-    def __init__(self, dataset: xarray.Dataset, compression: Union[str, Dict[str, str], Path, None]):
+    def __init__(self, dataset: xarray.Dataset, compression: Union[str, Dict[str, str], Path, None],
+                 chunk_strategy: Optional[Callable[[xarray.DataArray], tuple]] = None):
         self.dataset = dataset
+        self.chunk_strategy = chunk_strategy
 
-        # Process the compression argument to get a single string with per-variable specifications
-        compression = self.get_a_single_compression_string(compression)
-
-        # Save it
-        self.variable_encodings = parse_full_specification(compression)
+        # Dictionaries (also the ones read from a file) are parsed directly, without converting them to a single
+        # specification string first.
+        if isinstance(compression, str) and _is_a_specification_file(compression):
+            compression = Path(compression)
+        if isinstance(compression, Path):
+            compression = _load_yaml_file(str(compression))
+        if isinstance(compression, dict):
+            self.variable_encodings = parse_specification_dictionary(compression)
+        else:
+            # Process the compression argument to get a single string with per-variable specifications
+            compression = self.get_a_single_compression_string(compression)
+            self.variable_encodings = parse_full_specification(compression)
 
     @staticmethod
     def get_a_single_compression_string(compression: Union[str, Dict[str, str], Path, None]) -> Union[str, None]:
@@ -191,7 +318,7 @@ class DatasetEncoding(_Mapping):
 
         # In case it is a string, it can be directly a compression specification or a yaml file.
         # If it is a file, convert it to a Path
-        if isinstance(compression, str) and os.path.exists(compression):
+        if isinstance(compression, str) and _is_a_specification_file(compression):
             compression = Path(compression)
 
         if isinstance(compression, dict):
@@ -199,8 +326,7 @@ class DatasetEncoding(_Mapping):
             # the input dictionary to a single specification string and convert it back.
             return compression_dictionary_to_string(compression)
         if isinstance(compression, Path):
-            with compression.open("r", encoding="utf-8") as stream:
-                dict_of_strings = yaml.safe_load(stream)
+            dict_of_strings = _load_yaml_file(str(compression))
             return compression_dictionary_to_string(dict_of_strings)
         if isinstance(compression, str):
             # Convert the single string in a dictionary with an entry for each specified variable plus the defaults
@@ -224,51 +350,72 @@ class DatasetEncoding(_Mapping):
         data_default = self.variable_encodings[rules.DATA_DEFAULT_LABEL]
         coordinates_default = self.variable_encodings[rules.COORD_LABEL]
 
-        # Set encoding for coordinates
-        coordinate_encodings = {coord: deepcopy(coordinates_default) for coord in self.dataset.coords}
-        # Set encoding for data variables
-        data_variable_encodings = {
-            str(var): deepcopy(self.variable_encodings[str(var)]) if var in self.variable_encodings else deepcopy(
-                data_default) for
-            var
-            in self.dataset.data_vars}
+        # Without any compression there are no filters, so there's no need to chunk.
+        # Each variable still gets its own encoding, like in the general case, so that they are never shared.
+        if all(isinstance(_encoding, NullEncoding) for _encoding in self.variable_encodings.values()):
+            return {var: NullEncoding() for var in self.dataset.variables}
 
-        # Merge
-        all_encodings = {**coordinate_encodings, **data_variable_encodings}
+        # Set encoding for coordinates
+        all_encodings = {coord: coordinates_default.clone() for coord in self.dataset.coords}
+        # Set encoding for data variables, in the same dictionary.
+        # The encodings are keyed by the variable names as they are in the dataset, which is what xarray and chunk()
+        # expect, while the specification can only refer to them by their string representation.
+        variable_encodings = self.variable_encodings
+        for var in self.dataset.data_vars:
+            all_encodings[var] = variable_encodings.get(str(var), data_default).clone()
 
         # Need to specify chunk size, otherwise it breaks down.
         self.chunk(
             encodings=all_encodings,
             chunk_memory_size=enstools.encoding.chunk_size.chunk_size,
+            max_chunks_per_dim=enstools.encoding.chunk_size.max_chunks_per_dim,
         )
 
         return all_encodings
 
-    def chunk(self, encodings: Dict[Union[Hashable, str], Encoding], chunk_memory_size="10MB"):
+    def chunk(self, encodings: Dict[Union[Hashable, str], Encoding], chunk_memory_size="16MB",
+              max_chunks_per_dim: int = 8192):
         """
         Add a variable "chunksizes" to each variable encoding with the corresponding 
 
         Args:
             encodings (dict): Dictionary with the corresponding encoding for each variable.
             chunk_memory_size (str): Desired chunk size in memory.
+            max_chunks_per_dim (int): Maximum number of chunks along a single dimension.
         """
 
         chunk_memory_size = convert_to_bytes(chunk_memory_size)
 
         # Loop over all the variables
         for variable in self.dataset.data_vars:
-            data_array = self.dataset[variable]
-            type_size = data_array.dtype.itemsize
-
-            optimal_chunk_size = chunk_memory_size / type_size
-            chunk_sizes = find_chunk_sizes(data_array=data_array, chunk_size=optimal_chunk_size)
-            chunk_sizes = tuple(chunk_sizes[d] for d in data_array.dims)
-            encodings[variable].set_chunk_sizes(chunk_sizes)
-
-    @property
+            encoding = encodings[variable]
+            # Chunking is only needed by the compression filters.
+            if isinstance(encoding, NullEncoding):
+                continue
+            # The underlying Variable has everything needed, building a DataArray with its coordinates is slower.
+            data_variable = self.dataset.variables[variable]
+            # Scalars are stored contiguously, there's nothing to chunk.
+            if data_variable.ndim == 0:
+                continue
+            if self.chunk_strategy is not None:
+                chunk_sizes = tuple(self.chunk_strategy(self.dataset[variable]))
+            else:
+                optimal_chunk_size = chunk_memory_size / data_variable.dtype.itemsize
+                chunk_sizes = chunk_sizes_in_dim_order(data_variable.dims, data_variable.shape, optimal_chunk_size,
+                                                       max_chunks_per_dim=max_chunks_per_dim)
+            encoding.set_chunk_sizes(chunk_sizes)
+
+    @functools.cached_property
     def _kwargs(self):
+        # xarray accesses the mapping several times while writing, compute the encodings only once.
         return self.encoding()
 
+    def invalidate(self):
+        """
+        Discard the cached encodings, i.e. after modifying the dataset or the chunk size configuration.
+        """
+        self.__dict__.pop("_kwargs", None)
+
     def add_metadata(self):
         """
         Add the corresponding compression metadata to the dataset.
@@ -295,43 +442,132 @@ def is_a_valid_dataset_compression_specification(specification):
             - If the specification is successfully parsed without raising an exception, it is considered valid.
             - If an `InvalidCompressionSpecification` exception is raised during parsing,
             the specification is considered invalid.
+            - The result is cached, both for valid and invalid specifications.
     """
+    return _is_a_valid_specification(_normalize_specification(specification))
+
+
+@functools.lru_cache(maxsize=128)
+def _is_a_valid_specification(specification: str) -> bool:
+    # The encodings are not used, so there's no need to copy them as parse_full_specification does.
     try:
-        _ = parse_full_specification(specification)
+        _ = _parse_full_specification(specification)
         return True
     except InvalidCompressionSpecification:
         return False
 
 
-def find_chunk_sizes(data_array, chunk_size):
+def find_chunk_sizes(data_array, chunk_size, max_chunks_per_dim: int = 8192):
     """
     Determines the chunk sizes for each dimension of a data array based on a desired chunk size.
 
     Args:
         data_array: The data array for which chunk sizes are determined.
         chunk_size: The desired chunk size in terms of the number of elements.
+        max_chunks_per_dim: The maximum number of chunks along a single dimension.
 
     Returns:
         dict: A dictionary mapping each dimension to its corresponding chunk size.
     """
-    total_points = np.prod(data_array.shape)
+    chunk_sizes = chunk_sizes_in_dim_order(data_array.dims, data_array.shape, chunk_size,
+                                           max_chunks_per_dim=max_chunks_per_dim)
+    return dict(zip(data_array.dims, chunk_sizes))
+
+
+def chunk_sizes_in_dim_order(dims, shape, chunk_size, max_chunks_per_dim: int = 8192) -> tuple:
+    """
+    Same as find_chunk_sizes but working directly with the dimension names and the shape of a data array,
+    returning the chunk sizes as a tuple following the order of the dimensions.
+
+    Args:
+        dims: The names of the dimensions.
+        shape: The size of each dimension.
+        chunk_size: The desired chunk size in terms of the number of elements.
+        max_chunks_per_dim: The maximum number of chunks along a single dimension.
+
+    Returns:
+        tuple: The chunk size of each dimension.
+    """
+    total_points = math.prod(shape)
     num_chunks = max(1, int(total_points // chunk_size))
-    chunk_sizes = {}
-    chunk_number = {}
+    chunk_sizes = list(shape)
 
     # Sort dimensions such that 'time' is always first and rest by size
-    dims = sorted(data_array.dims, key=lambda x: (x != 'time', data_array[x].shape))
+    order = sorted(range(len(dims)), key=lambda i: (dims[i] != 'time', shape[i]))
 
     pending_num_chunks = num_chunks
-    for dim in dims:
-        if dim == 'time' or pending_num_chunks > 1:
-            chunk_sizes[dim] = max(1, int(data_array[dim].size // pending_num_chunks))
-            chunk_number[dim] = data_array[dim].size // chunk_sizes[dim]
+    for index in order:
+        # If we have already chunked in the 'time' dimension and pending_num_chunks <= 1,
+        # then keep the whole dimension together in one chunk
+        if dims[index] == 'time' or pending_num_chunks > 1:
+            size = shape[index]
+            # Bound the number of chunks along this dimension
+            chunk_sizes[index] = max(1, int(size // pending_num_chunks), math.ceil(size / max_chunks_per_dim))
+            chunk_number = max(1, size // chunk_sizes[index])
 
-            pending_num_chunks = math.ceil(pending_num_chunks / chunk_number[dim])
-        else:
-            # If we have already chunked in the 'time' dimension and pending_num_chunks <= 1,
-            # then keep the whole dimension together in one chunk
-            chunk_sizes[dim] = data_array[dim].size
-    return chunk_sizes
+            pending_num_chunks = math.ceil(pending_num_chunks / chunk_number)
+    return tuple(chunk_sizes)
+
+
+def netcdf4_chunk_sizes(dims, shape, itemsize: int, target_bytes: int, unlimited_dims=(),
+                        min_chunk_bytes: int = 16 * 1024) -> tuple:
+    """
+    Determines the chunk sizes using a heuristic similar to the one used by netCDF4:
+    unlimited (append-like) dimensions get a chunk size of 1 and the largest chunk dimension is halved
+    until the chunk fits in the target size, without going below a minimum chunk size.
+
+    See netcdf4_chunk_strategy to use it as a chunk_strategy of DatasetEncoding.
 
+    Args:
+        dims: The names of the dimensions.
+        shape: The size of each dimension.
+        itemsize: The size in bytes of a single element.
+        target_bytes: The desired chunk size in bytes.
+        unlimited_dims: The dimensions that get a chunk size of 1.
+        min_chunk_bytes: The chunks won't be made smaller than this size in bytes.
+
+    Returns:
+        tuple: The chunk size of each dimension.
+    """
+    chunk_sizes = [1 if dim in unlimited_dims else max(1, size) for dim, size in zip(dims, shape)]
+    chunk_bytes = itemsize * math.prod(chunk_sizes)
+    while chunk_bytes > target_bytes:
+        index = max(range(len(chunk_sizes)), key=chunk_sizes.__getitem__)
+        largest = chunk_sizes[index]
+        halved = (largest + 1) // 2
+        halved_bytes = chunk_bytes // largest * halved
+        if largest == 1 or halved_bytes < min_chunk_bytes:
+            break
+        chunk_sizes[index] = halved
+        chunk_bytes = halved_bytes
+    return tuple(chunk_sizes)
+
+
+def netcdf4_chunk_strategy(data_array: xarray.DataArray, target_bytes: Union[int, str] = "1MB",
+                           unlimited_dims=()) -> tuple:
+    """
+    Chunk strategy for DatasetEncoding following the netCDF4/HDF5 recommendations:
+    the time dimension and the given unlimited dimensions get a chunk size of 1
+    and the rest are reduced with netcdf4_chunk_sizes until the chunks are no bigger than target_bytes, i.e:
+
+    >>> DatasetEncoding(dataset, "lossless", chunk_strategy=netcdf4_chunk_strategy)
+
+    xarray keeps the unlimited dimensions in the encoding of the dataset, not in the one of its variables,
+    so they have to be passed explicitly:
+
+    >>> strategy = functools.partial(netcdf4_chunk_strategy, unlimited_dims=dataset.encoding.get("unlimited_dims", ()))
+    >>> DatasetEncoding(dataset, "lossless", chunk_strategy=strategy)
+
+    Args:
+        data_array: The variable to chunk.
+        target_bytes: The desired chunk size, in bytes or as a string like "1MB".
+        unlimited_dims: Dimensions, besides time, that get a chunk size of 1.
+
+    Returns:
+        tuple: The chunk size of each dimension of the variable.
+    """
+    if isinstance(target_bytes, str):
+        target_bytes = convert_to_bytes(target_bytes)
+    unlimited_dims = set(unlimited_dims) | {"time"}
+    return netcdf4_chunk_sizes(data_array.dims, data_array.shape, data_array.dtype.itemsize, target_bytes,
+                               unlimited_dims=unlimited_dims)
@@ -1,6 +1,8 @@
 """
 This module provides configurations and mappings related to lossy and lossless compressors.
 """
+import os
+
 import hdf5plugin
 
 # Dictionary of implemented lossy compressors and their respective modes and ranges.
@@ -27,11 +29,19 @@ lossy_compressors_and_modes = {
 lossy_compressors = list(lossy_compressors_and_modes)
 
 # Create a dictionary containing the available compression modes for each lossy compressor
-lossy_compression_modes = {c: list(lossy_compressors_and_modes) for c in lossy_compressors}
+lossy_compression_modes = {c: list(lossy_compressors_and_modes[c]) for c in lossy_compressors}
 
 # List of available BLOSC backends for lossless compression
 lossless_backends = ['blosclz', 'lz4', 'lz4hc', 'snappy', 'zlib', 'zstd']
 
+# Shuffle filters that BLOSC can apply before the lossless backend, with their hdf5plugin.Blosc values.
+# Byte-shuffling groups together bytes of the same significance, which pays off for floating point data.
+lossless_shuffles = {
+    "noshuffle": hdf5plugin.Blosc.NOSHUFFLE,
+    "shuffle": hdf5plugin.Blosc.SHUFFLE,
+    "bitshuffle": hdf5plugin.Blosc.BITSHUFFLE,
+}
+
 # Mappings between SZ modes and the keywords used in hdf5plugin
 sz_mode_map = {
     "abs": "absolute",
@@ -41,10 +51,32 @@ sz_mode_map = {
     "norm2": "norm2",
 }
 
-# Mapping between compressor names and hdf5plugin classes
+# Flattened view of lossy_compressors_and_modes, built once so that validating a lossy encoding takes a single lookup.
+# Maps each valid (compressor, mode) pair to the range and type of its parameter and the keyword used in hdf5plugin.
+lossy_parameters = {
+    (compressor, mode): (*properties["range"], properties["type"], sz_mode_map.get(mode, mode))
+    for compressor, modes in lossy_compressors_and_modes.items()
+    for mode, properties in modes.items()
+}
 
+# Mapping between compressor names and hdf5plugin classes.
+# Importing hdf5plugin (above) also registers its filters in HDF5, which is needed to read compressed files.
 compressor_map = {
     "zfp": hdf5plugin.Zfp,
     "sz": hdf5plugin.SZ,
     "sz3": hdf5plugin.SZ3,
 }
+
+
+def set_blosc_nthreads(nthreads: int = None) -> None:
+    """
+    Lets the BLOSC filter compress with several threads, it is single-threaded unless told otherwise.
+    c-blosc reads the number of threads from the BLOSC_NTHREADS environment variable, so this setting is opt-in:
+    it applies to the whole process and is inherited by its child processes (e.g. dask workers).
+
+    Args:
+        nthreads (int): Number of threads, by default the number of CPUs up to 8.
+    """
+    if nthreads is None:
+        nthreads = min(8, os.cpu_count() or 1)
+    os.environ["BLOSC_NTHREADS"] = str(nthreads)
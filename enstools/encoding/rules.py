@@ -11,6 +11,9 @@ VARIABLE_NAME_SEPARATOR = ":"
 # Separator between the compression type, the compressor, the mode and the parameter
 COMPRESSION_SPECIFICATION_SEPARATOR = ","
 
+# Specifications meaning that a variable is not compressed
+NULL_SPECIFICATIONS = frozenset({None, "None", "none"})
+
 # Default Labels
 DATA_DEFAULT_LABEL = "default"
 COORD_LABEL = "coordinates"
@@ -20,5 +23,6 @@ DATA_DEFAULT_VALUE = "lossless"
 COORD_DEFAULT_VALUE = "lossless"
 
 # Lossless defaults
-LOSSLESS_DEFAULT_BACKEND = "lz4"
+LOSSLESS_DEFAULT_BACKEND = "zstd"
 LOSSLESS_DEFAULT_COMPRESSION_LEVEL = 5
+LOSSLESS_DEFAULT_SHUFFLE = "shuffle"
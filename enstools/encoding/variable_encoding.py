@@ -7,6 +7,7 @@ This module defines various encodings and exceptions for compression, as well as
 """
 
 
+import functools
 import logging
 from typing import Mapping, Union
 
@@ -15,19 +16,19 @@ import hdf5plugin
 from enstools.encoding import rules, definitions
 from enstools.encoding.errors import InvalidCompressionSpecification
 from .definitions import lossy_compressors_and_modes
-from .rules import LOSSLESS_DEFAULT_BACKEND, LOSSLESS_DEFAULT_COMPRESSION_LEVEL, COMPRESSION_SPECIFICATION_SEPARATOR
+from .rules import LOSSLESS_DEFAULT_BACKEND, LOSSLESS_DEFAULT_COMPRESSION_LEVEL, COMPRESSION_SPECIFICATION_SEPARATOR, \
+    NULL_SPECIFICATIONS
 
-# Change logging level for the hdf5plugin to avoid unnecessary warnings
-loggers = {name: logging.getLogger(name) for name in logging.root.manager.loggerDict}
-hdf5plugin_loggers = [key for key in loggers.keys() if key.count("hdf5plugin")]
-for key in hdf5plugin_loggers:
-    loggers[key].setLevel(logging.WARNING)
+# Change logging level for the hdf5plugin to avoid unnecessary warnings.
+# Its module loggers (hdf5plugin._filters, ...) inherit the level from the package logger.
+logging.getLogger("hdf5plugin").setLevel(logging.WARNING)
 
 
 class _Mapping(Mapping):
     """
     Subclass to implement dunder methods that are mandatory for Mapping to avoid repeating the code everywhere.
     """
+    __slots__ = ("_kwargs",)
 
     def __init__(self) -> None:
         super().__init__()
@@ -45,11 +46,46 @@ class _Mapping(Mapping):
     def __len__(self):
         return len(self._kwargs)
 
+    # The generic Mapping mixins go through __getitem__ and KeyError handling,
+    # delegate to the underlying dictionary instead since xarray accesses the encodings often.
+    def __contains__(self, item):
+        return item in self._kwargs
+
+    def get(self, key, default=None):
+        return self._kwargs.get(key, default)
+
+    def keys(self):
+        return self._kwargs.keys()
+
+    def items(self):
+        return self._kwargs.items()
+
+    def values(self):
+        return self._kwargs.values()
+
 
 class Encoding(_Mapping):
     """
     Base case for encoding representation.
+
+    Encodings are created for every variable of a dataset, so they use __slots__ instead of a __dict__.
+
+    The mapping returned by encoding() is only built when the encoding is first used as a mapping,
+    validating or converting a specification to a string doesn't need to construct the HDF5 filters.
     """
+    __slots__ = ()
+
+    def __init__(self) -> None:  # pylint: disable=super-init-not-called
+        # Leave _kwargs unset, it is built by __getattr__ on first access.
+        pass
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not found, i.e. _kwargs before its first access.
+        if name == "_kwargs":
+            self._kwargs = dict(self.encoding())
+            return self._kwargs
+        raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}")
+
     def check_validity(self) -> bool:
         """
         Checks the validity of the encoding.
@@ -107,6 +143,35 @@ class Encoding(_Mapping):
         """
         self._kwargs["chunksizes"] = chunk_sizes
 
+    def clone(self) -> "Encoding":
+        """
+        Returns a shallow copy of the encoding with its own encoding dictionary.
+
+        Only the encoding dictionary gets modified after creation (i.e. by set_chunk_sizes),
+        so copying it is enough and much cheaper than a deepcopy.
+
+        Returns:
+        - Encoding: A copy of the encoding.
+
+        """
+        new = object.__new__(type(self))
+        for attribute in _slot_names(type(self)):
+            if hasattr(self, attribute):
+                setattr(new, attribute, getattr(self, attribute))
+        # Subclasses defined without __slots__ still have a __dict__
+        if hasattr(self, "__dict__"):
+            new.__dict__.update(self.__dict__)
+        new._kwargs = dict(self._kwargs)
+        return new
+
+
+@functools.lru_cache(maxsize=None)
+def _slot_names(cls: type) -> tuple:
+    """
+    Returns the names of all the slots defined in a class and its parents.
+    """
+    return tuple(slot for klass in cls.__mro__ for slot in getattr(klass, "__slots__", ()))
+
 
 class VariableEncoding(_Mapping):
     """
@@ -135,6 +200,10 @@ class VariableEncoding(_Mapping):
 
     >>> VariableEncoding(backend="snappy", compression_level=9)
 
+    As well as the shuffle applied before compressing (shuffle, bitshuffle or noshuffle).
+
+    >>> VariableEncoding(backend="zstd", shuffle="bitshuffle")
+
     """
 
     def __new__(cls,
@@ -144,6 +213,7 @@ class VariableEncoding(_Mapping):
                 parameter: Union[str, float, int] = None,
                 backend: str = None,
                 compression_level: int = None,
+                shuffle: str = None,
                 ) -> Encoding:
         return get_variable_encoding(specification=specification,
                                      compressor=compressor,
@@ -151,10 +221,13 @@ class VariableEncoding(_Mapping):
                                      parameter=parameter,
                                      backend=backend,
                                      compression_level=compression_level,
+                                     shuffle=shuffle,
                                      )
 
 
 class NullEncoding(Encoding):
+    __slots__ = ()
+
     def check_validity(self) -> bool:
         return True
 
@@ -169,15 +242,16 @@ class NullEncoding(Encoding):
 
 
 class LosslessEncoding(Encoding):
-    def __init__(self, backend: str, compression_level: int):
+    __slots__ = ("backend", "compression_level", "shuffle")
+
+    def __init__(self, backend: str, compression_level: int, shuffle: str = None):
         super().__init__()
         self.backend = backend if backend is not None else rules.LOSSLESS_DEFAULT_BACKEND
         self.compression_level = compression_level if compression_level is not None \
             else rules.LOSSLESS_DEFAULT_COMPRESSION_LEVEL
+        self.shuffle = shuffle if shuffle is not None else rules.LOSSLESS_DEFAULT_SHUFFLE
 
         self.check_validity()
-        # Trying to convert it to a dictionary already here.
-        self._kwargs = dict(self.encoding())
 
     def check_validity(self) -> bool:
         if self.backend not in definitions.lossless_backends:
@@ -186,26 +260,37 @@ class LosslessEncoding(Encoding):
         if not 1 <= self.compression_level <= 9:
             raise InvalidCompressionSpecification(f"Compression level {self.compression_level} must be within 1 and 9.")
 
+        if self.shuffle not in definitions.lossless_shuffles:
+            raise InvalidCompressionSpecification(f"Shuffle {self.shuffle!r} is not a valid shuffle.")
+
         return True
 
     def to_string(self) -> str:
-        return rules.COMPRESSION_SPECIFICATION_SEPARATOR.join(["lossless", self.backend, str(self.compression_level)])
+        parts = ["lossless", self.backend, str(self.compression_level)]
+        # The default shuffle is omitted, so that the usual specifications remain unchanged.
+        if self.shuffle != rules.LOSSLESS_DEFAULT_SHUFFLE:
+            parts.append(self.shuffle)
+        return rules.COMPRESSION_SPECIFICATION_SEPARATOR.join(parts)
 
     def encoding(self) -> Mapping:
-        return hdf5plugin.Blosc(cname=self.backend, clevel=self.compression_level)
+        return hdf5plugin.Blosc(cname=self.backend, clevel=self.compression_level,
+                                shuffle=definitions.lossless_shuffles[self.shuffle])
 
     def description(self) -> str:
         return f"Losslessly compressed with the HDF5 Blosc filter: {self.to_string()} " \
-               f"(Using {self.backend!r} with compression level {self.compression_level})"
+               f"(Using {self.backend!r} with compression level {self.compression_level} and {self.shuffle!r})"
 
     def __repr__(self):
-        return f"{self.__class__.__name__}(backend={self.backend}, compression_level={self.compression_level})"
+        return f"{self.__class__.__name__}(backend={self.backend}, compression_level={self.compression_level}, " \
+               f"shuffle={self.shuffle})"
 
 
 class LossyEncoding(Encoding):
     """
         Encoding subclass for lossy compression.
         """
+    __slots__ = ("compressor", "mode", "parameter")
+
     def __init__(self, compressor: str, mode: str, parameter: Union[float, int]):
         super().__init__()
         self.compressor = compressor
@@ -215,9 +300,6 @@ class LossyEncoding(Encoding):
 
         self.check_validity()
 
-        # Trying to convert it to a dictionary already here.
-        self._kwargs = dict(self.encoding())
-
     def check_validity(self):
         """
         Checks the validity of the compressor, mode, and parameter.
@@ -229,24 +311,21 @@ class LossyEncoding(Encoding):
         - bool: True if the compressor, mode, and parameter are valid.
 
         """
-        # Check compressor validity
-        if self.compressor not in definitions.lossy_compressors_and_modes:
-            raise InvalidCompressionSpecification(f"Invalid compressor {self.compressor}")
-        # Check compression mode validity
-        if self.mode not in definitions.lossy_compressors_and_modes[self.compressor]:
+        # Get parameter range and type, checking the compressor and compression mode validity
+        try:
+            range_min, range_max, mode_type, _ = definitions.lossy_parameters[(self.compressor, self.mode)]
+        except (KeyError, TypeError):
+            if self.compressor not in definitions.lossy_compressors_and_modes:
+                raise InvalidCompressionSpecification(f"Invalid compressor {self.compressor}")
             raise InvalidCompressionSpecification(f"Invalid mode {self.mode!r} for compressor {self.compressor!r}")
-
-        # Get parameter range and type
-        mode_range = definitions.lossy_compressors_and_modes[self.compressor][self.mode]["range"]
-        mode_type = definitions.lossy_compressors_and_modes[self.compressor][self.mode]["type"]
-        # Check type
+        # Check type, only trying to cast parameters that don't have the right type already
         if not isinstance(self.parameter, mode_type):
             try:
                 self.parameter = mode_type(self.parameter)
-            except TypeError as err:
-                raise InvalidCompressionSpecification(f"Invalid parameter type {self.parameter!r}")
+            except (TypeError, ValueError) as err:
+                raise InvalidCompressionSpecification(f"Invalid parameter type {self.parameter!r}") from err
         # Check range
-        if self.parameter <= mode_range[0] or self.parameter >= mode_range[1]:
+        if self.parameter <= range_min or self.parameter >= range_max:
             raise InvalidCompressionSpecification(f"Parameter out of range {self.parameter!r}")
         return True
 
@@ -269,8 +348,8 @@ class LossyEncoding(Encoding):
         - Mapping: The mapping of encoding parameters.
 
         """
-        mode = definitions.sz_mode_map[self.mode] if self.mode in definitions.sz_mode_map else self.mode
-        arguments = {mode: self.parameter}
+        keyword = definitions.lossy_parameters[(self.compressor, self.mode)][3]
+        arguments = {keyword: self.parameter}
         return definitions.compressor_map[self.compressor](**arguments)
 
     def description(self) -> str:
@@ -306,8 +385,18 @@ def parse_variable_specification(var_spec: str) -> Encoding:
     Returns
     -------
 
+    The parsing is cached for identical specifications, each call gets its own copy of the encoding.
+    """
+    return _parse_variable_specification(var_spec).clone()
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_variable_specification(var_spec: str) -> Encoding:
     """
-    if var_spec in (None, "None", "none"):
+    Cached implementation of parse_variable_specification.
+    The returned encoding is shared between calls and must not be modified.
+    """
+    if var_spec in NULL_SPECIFICATIONS:
         return NullEncoding()
 
     # Split the specification in the different parts.
@@ -316,7 +405,8 @@ def parse_variable_specification(var_spec: str) -> Encoding:
     if var_spec_parts[0] == "lossless":
         backend = var_spec_parts[1] if len(var_spec_parts) > 1 else None
         compression_level = int(var_spec_parts[2]) if len(var_spec_parts) > 2 else None
-        return LosslessEncoding(backend, compression_level)
+        shuffle = var_spec_parts[3] if len(var_spec_parts) > 3 else None
+        return LosslessEncoding(backend, compression_level, shuffle)
     # Treatment for lossy
     if var_spec_parts[0] == "lossy":
         # Lossy specifications must have 4 elements (lossy,compressor,mode,parameter)
@@ -325,15 +415,14 @@ def parse_variable_specification(var_spec: str) -> Encoding:
 
         # Get the different components.
         compressor, mode, specification = var_spec_parts[1:]
-        # Check that the compressor is a valid option.
-        if compressor not in lossy_compressors_and_modes:
-            raise InvalidCompressionSpecification(f"Invalid compressor {compressor!r} in {var_spec!r}")
-        # Check that the mode is a valid option.
-        if mode not in lossy_compressors_and_modes[compressor]:
+        # Check that the compressor and the mode are valid options.
+        if (compressor, mode) not in definitions.lossy_parameters:
+            if compressor not in lossy_compressors_and_modes:
+                raise InvalidCompressionSpecification(f"Invalid compressor {compressor!r} in {var_spec!r}")
             raise InvalidCompressionSpecification(
                 f"Invalid mode {mode!r} for compressor {compressor!r} in {var_spec!r}")
         # Cast the specification to the proper type.
-        specification_type = lossy_compressors_and_modes[compressor][mode]["type"]
+        specification_type = definitions.lossy_parameters[(compressor, mode)][2]
         try:
             specification = specification_type(specification)
         except ValueError:
@@ -351,33 +440,39 @@ def get_variable_encoding(
         parameter: Union[str, float, int] = None,
         backend: str = None,
         compression_level: int = None,
+        shuffle: str = None,
 ) -> Encoding:
     """
         Wildcard entry point for all ways of specifying an encoding:
         - Using a string specification
         - For lossy compression, specifying the compressor, the mode and the parameter
-        - For lossless compression, specifying the backend and the compression level
+        - For lossless compression, specifying the backend, the compression level and the shuffle
     """
 
-    # Two special cases:
-    if (specification is None) and (compressor is None) and (backend is None):
-        return LosslessEncoding(backend=LOSSLESS_DEFAULT_BACKEND, compression_level=LOSSLESS_DEFAULT_COMPRESSION_LEVEL)
-
-    assert (specification is None) + (compressor is None) + (backend is None) == 2, \
-        "Only one of the options can be used to create an Encoding"
-    if specification:
+    # Only one of the options can be used, checked explicitly so that it also holds when running with -O.
+    # The shuffle is a lossless option, with a specification it goes in the string (e.g. lossless,zstd,5,bitshuffle).
+    if specification is not None:
+        if compressor is not None or backend is not None or shuffle is not None:
+            raise InvalidCompressionSpecification("Only one of the options can be used to create an Encoding")
         return parse_variable_specification(specification)
-    if compressor:
+    if compressor is not None:
+        if backend is not None or shuffle is not None:
+            raise InvalidCompressionSpecification("Only one of the options can be used to create an Encoding")
         return LossyEncoding(compressor=compressor, mode=mode, parameter=parameter)
-    if backend:
+    if backend is not None:
         if compression_level is None:
             compression_level = LOSSLESS_DEFAULT_COMPRESSION_LEVEL
-        return LosslessEncoding(backend=backend, compression_level=compression_level)
+        return LosslessEncoding(backend=backend, compression_level=compression_level, shuffle=shuffle)
+    # Default case
+    return LosslessEncoding(backend=LOSSLESS_DEFAULT_BACKEND, compression_level=LOSSLESS_DEFAULT_COMPRESSION_LEVEL,
+                            shuffle=shuffle)
 
 
+@functools.lru_cache(maxsize=128)
 def is_valid_variable_compression_specification(specification):
+    # The result is cached, parse errors are not cached by _parse_variable_specification.
     try:
-        _ = parse_variable_specification(specification)
+        _ = _parse_variable_specification(specification)
         return True
     except InvalidCompressionSpecification:
         return False
@@ -32,7 +32,7 @@ def example_01() -> None:
     compression_specification_dictionary = {"default": "lossy,zfp,rate,4", "vorticity": "lossy,sz,abs,0.1"}
     compression_specification_file = "compression_specification.yaml"
     with open(compression_specification_file, "w") as stream:
-        yaml.dump(compression_specification_dictionary, stream)
+        yaml.dump(compression_specification_dictionary, stream, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper))
 
     #    Pass the file path as a compression argument
     encoding = FilterEncodingForXarray(dataset=dataset, compression=compression_specification_file)
@@ -55,17 +55,22 @@ def create_dummy_xarray_dataset(variables: list = None) -> xr.Dataset:
     nx, ny, nz, t = 360, 91, 31, 5
     lon = np.linspace(-180, 180, nx)
     lat = np.linspace(-90, 90, ny)
-    levels = np.array(range(nz))
+    levels = np.arange(nz)
 
     data_size = (t, nz, nx, ny)
     var_dimensions = ["time", "level", "lon", "lat"]
 
     # Select data type
     data_type = np.float32
-    # Create some random data
-    var_data = data_type(15 + 8 * np.random.randn(*data_size))
-
-    var_dict = {var: (var_dimensions, var_data) for var in variables}
+    # Create some random data for each variable, so that each one is compressed independently.
+    # It is generated directly with the final data type and scaled in place to avoid temporary float64 arrays.
+    rng = np.random.default_rng()
+    var_dict = {}
+    for var in variables:
+        var_data = rng.standard_normal(size=data_size, dtype=data_type)
+        var_data *= 8
+        var_data += 15
+        var_dict[var] = (var_dimensions, var_data)
 
     ds = xr.Dataset(
         var_dict,
@@ -1,7 +1,8 @@
+import os
+
 import pytest
 import xarray as xr
 import numpy as np
-import pandas as pd
 import yaml
 import hdf5plugin
 
@@ -11,91 +12,254 @@ from enstools.encoding.errors import InvalidCompressionSpecification
 from enstools.encoding.dataset_encoding import DatasetEncoding
 from enstools.encoding.variable_encoding import VariableEncoding
 
+# Write specification files with the LibYAML based dumper when available, like the reader does.
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+# Specifications with their validity
+LONG_LIST_OF_CASES = (
+    ("lossless", True),
+    ("lossy,lossless", False),
+    ("lossless,lz4,5", True),
+    ("lossy,zfp,rate,4.0,precision", False),
+    ("lossy,sz,abs,0.01", True),
+    ("lossy,sz,mode,0.01", False),
+    ("lossy,sz3,abs,0.01", True),
+    ("var1:lossless var2:lossy,sz,rel,1e-3", True),
+    ("var1:lossless var2:lossy,sz,rel,1e-3,pw", False),
+    ("default:lossless,lz4,3 var1:lossy,zfp,rate,4.0", True),
+    ("default:lossless,lz4,3 var1:lossy,zfp,rate,4.0,precision", False),
+    ("lossless,snappy", True),
+    ("lossless,snapp", False),
+    ("lossless,snappy,5", True),
+    ("lossless,snappy,0", False),
+    ("lossless,snappy,11", False),
+    ("lossy,zfp,accuracy,0.01", True),
+    ("lossy,zfp,accurancy,0.01", False),
+    ("lossy,zfp,accurancy,0.01", False),
+    ("lossy,sz,pw_rel,0.05", True),
+    ("lossy,sz,pw_rel,-0.05", False),
+    ("lossy,sz,pw_rel,0", False),
+    ("lossy,sz,pw_rel,1", False),
+    ("var1:lossless var2:lossy,sz,abs,0.1", True),
+    ("var1:lossless var2:lossy,sz,abs,-0.1", False),
+    ("var1:lossless var2:lossy,sz,abs,2", True),
+    ("default:lossy,zfp,rate,4.0 var1:lossless", True),
+    ("default:lossy,zfp,rate,4.0 var1:lossless,lz4", True),
+    ("default:lossy,zfp,rate,4.0 var1:lossless,lz4,5", True),
+    ("default:lossy,zfp,rate,4.0 var1:lossless,lz4,0", False),
+    ("default:lossy,zfp,rate,4.0 var1:lossless,lz4,11", False),
+    ("lossless,zstd", True),
+    ("lossless,zst", False),
+    ("lossless,zstd,5", True),
+    ("lossless,zstd,0", False),
+    ("lossless,zstd,11", False),
+    ("lossy,zfp,precision,13", True),
+    ("lossy,zfp,precission,13", False),
+    ("lossy,zfp,precision,13,rate", False),
+    ("lossy,zfp,precision,-13", False),
+    ("var1:lossless var2:lossy,zfp,accuracy,0.01", True),
+    ("var1:lossless var2:lossy,zfp,accurancy,0.01", False),
+    ("default:lossless var1:lossy,zfp,rate,4.0", True),
+    ("default:lossless,zlib var1:lossy,zfp,rate,4.0", True),
+    # Some tricky cases
+    ("lossless,lz4,2 default:lossy,zfp,rate,3", False),
+    ("lossless,lz4,2 var1:lossy,zfp,rate,3 var2:lossless", True),
+    ("lossless,lz4,2 var1:lossy,zfp,rate,3 var2:lossless,lz4hc,4", True),
+    ("lossless,lz4,2 var1:lossy,zfp,rate,30 var2:lossless,lz4hc,4", True),
+    ("lossy,sz,pw_rel,1e-2", True),
+    ("lossy,sz,pw_rel,1e-20", True),
+    ("lossy,sz,abs,1e-20", True),
+    ("lossy,sz,abs,-1e-2", False),
+    ("lossy,sz,abs,1", True),
+    ("default:lossy,sz,abs,1 lossless,lz4,3", False),
+    ("lossy,sz,abs,1 lossless,lz4,3", False),
+    ("lossy,zfp,rate,3 lossy,sz,abs,1", False),
+    ("default:lossy,zfp,rate,3 default:lossy,sz,abs,1", False),
+    ("lossy,zfp,rate,3 var1:lossy,sz,abs,1", True),
+    ("lossy,zfp,rate,3 lossless,lz4,3", False),
+    ("lossy,zfp,rate,3 var1:lossless,lz4,3", True),
+    # More tricky cases
+    ("lossless,lz4,3 lossless,lz4hc,3", False),  # Two default values provided
+    ("lossless,lz4,3 lossy,zfp,rate,4.0 lossless,snappy,9", False),  # Two default values provided
+    ("var1:lossless,lz4,3 var2:lossy,zfp,rate,4.0 var1:lossless,snappy,9", False),  # var1 specified twice
+    ("lossy,zfp,precision,0.5", False),  # precision expects an integer
+    ("lossy,zfp,precision,32.5", False),  # precision expects an integer
+    ("lossy,zfp,rate,-0.5", False),  # Rate should be positive
+    ("lossy,zfp,rate,32.5", False),  # Rate should be between 0 and 32
+    ("lossy,sz,pw_rel,1.5 lossy,sz,pw_rel,1.5", False),  # Two default values provided
+    ("lossy,zfp,abs,1.5", False),  # abs is not a valid mode for zfp
+    ("lossy,sz,abs,1.5 lossless,zfp,3", False),
+    (None, True),  # None should be a possibility
+    ("None", True),  # None should be a possibility, also provided as a string
+    ("none", True),  # None should be a possibility, also provided as a string
+    ("", False),  # An empty specification is not valid
+    ({}, False),  # Neither is an empty dictionary
+)
+
+
+# Different cases that should raise a wrong specification error.
+WRONG_VARIABLE_SPECIFICATIONS = (
+    "poijasduiohqwoir",
+    "lossly",
+    "random",
+    "zfp,rate,2",
+    "lossy,",
+    "lossy:zfp:rate:1",
+)
+
 
 class TestEncoding:
     def test_create_dataset(self) -> None:
         # Create a dummy dataset with few variables
         dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
 
-    def test_DatasetEncoding_lossless(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossless")
-
-    def test_DatasetEncoding_None(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, None)
-
-    def test_DatasetEncoding_multivariate_lossy(self) -> None:
+    def test_DatasetEncoding_lossless(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossless")
+
+    def test_DatasetEncoding_None(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, None)
+
+    def test_DatasetEncoding_None_encoding(self, dummy_dataset) -> None:
+        encoding = DatasetEncoding(dummy_dataset, None).encoding()
+        assert set(encoding) == set(dummy_dataset.variables)
+        assert all(len(var_encoding) == 0 for var_encoding in encoding.values())
+        assert len({id(var_encoding) for var_encoding in encoding.values()}) == len(encoding)
+
+    def test_DatasetEncoding_scalar_variable(self, dummy_dataset) -> None:
+        dataset = dummy_dataset[["temperature"]]
+        dataset["scalar"] = xr.DataArray(np.float32(1.0))
+        encoding = DatasetEncoding(dataset, "lossless").encoding()
+        assert "chunksizes" not in encoding["scalar"]
+        assert len(encoding["temperature"]["chunksizes"]) == 4
+
+    def test_DatasetEncoding_non_string_variable_name(self, dummy_dataset) -> None:
+        dataset = dummy_dataset[["temperature"]]
+        dataset[1] = dataset["temperature"]
+        encoding = DatasetEncoding(dataset, "lossless 1:lossy,zfp,rate,4").encoding()
+        assert encoding[1].to_string() == "lossy,zfp,rate,4.0"
+        assert "chunksizes" in encoding[1]
+
+    def test_DatasetEncoding_uncompressed_variable(self, dummy_dataset) -> None:
+        encoding = DatasetEncoding(dummy_dataset, "lossless temperature:none").encoding()
+        assert "chunksizes" not in encoding["temperature"]
+        assert "chunksizes" in encoding["vorticity"]
+
+    def test_DatasetEncoding_chunk_strategy(self, dummy_dataset) -> None:
+        def time_steps(data_array):
+            return tuple(1 if dim == "time" else size for dim, size in zip(data_array.dims, data_array.shape))
+
+        encoding = DatasetEncoding(dummy_dataset, "lossless", chunk_strategy=time_steps).encoding()
+        for variable in dummy_dataset.data_vars:
+            assert encoding[variable]["chunksizes"] == time_steps(dummy_dataset[variable])
+
+    def test_DatasetEncoding_multivariate_lossy(self, dummy_dataset) -> None:
         # Few cases with lossy compression:
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
 
         # Try with a single string
         compression_specification_string = \
             "lossy,sz,pw_rel,0.0001 temperature:lossy,zfp,rate,4 vorticity:lossy,sz,abs,0.1"
-        encoding = DatasetEncoding(dataset=dataset, compression=compression_specification_string)
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression=compression_specification_string)
 
-    def test_DatasetEncoding_dictionary(self) -> None:
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_dictionary(self, dummy_dataset) -> None:
         compression_specification_dictionary = {"temperature": "lossy,zfp,rate,4", "vorticity": "lossy,sz,abs,0.1"}
-        encoding = DatasetEncoding(dataset=dataset, compression=compression_specification_dictionary)
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression=compression_specification_dictionary)
 
-    def test_DatasetEncoding_file(self) -> None:
-        import os
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+        # The dictionary has to be equivalent to the single string specification.
+        from enstools.encoding.dataset_encoding import compression_dictionary_to_string
+        string_encoding = DatasetEncoding(dataset=dummy_dataset,
+                                          compression=compression_dictionary_to_string(
+                                              compression_specification_dictionary))
+        assert {key: value.to_string() for key, value in encoding.variable_encodings.items()} == \
+            {key: value.to_string() for key, value in string_encoding.variable_encodings.items()}
+
+    def test_DatasetEncoding_file(self, dummy_dataset, tmp_path) -> None:
         compression_specification_dictionary = {"default": "lossy,zfp,rate,4", "vorticity": "lossy,sz,abs,0.1"}
-        compression_specification_file = "compression_specification.yaml"
+        compression_specification_file = tmp_path / "compression_specification.yaml"
         with open(compression_specification_file, "w") as stream:
-            yaml.dump(compression_specification_dictionary, stream)
-        #    Pass the file path as a compression argument
-        encoding = DatasetEncoding(dataset=dataset, compression=compression_specification_file)
-
-        os.remove(compression_specification_file)
+            yaml.dump(compression_specification_dictionary, stream, Dumper=YAML_DUMPER)
+        #    Pass the file path as a compression argument, as a string
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression=str(compression_specification_file))
+        assert encoding.variable_encodings["vorticity"].to_string() == "lossy,sz,abs,0.1"
+
+    def test_DatasetEncoding_file_with_separator_in_path(self, dummy_dataset, tmp_path) -> None:
+        compression_specification_file = tmp_path / "run,1" / "compression_specification.yaml"
+        compression_specification_file.parent.mkdir()
+        compression_specification_file.write_text(yaml.dump({"default": "lossy,zfp,rate,4"}, Dumper=YAML_DUMPER))
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression=str(compression_specification_file))
+        assert encoding.variable_encodings["default"].to_string() == "lossy,zfp,rate,4.0"
+
+    def test_DatasetEncoding_modified_file(self, dummy_dataset, tmp_path) -> None:
+        compression_specification_file = tmp_path / "compression_specification.yaml"
+        compression_specification_file.write_text(yaml.dump({"default": "lossy,zfp,rate,4"}, Dumper=YAML_DUMPER))
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression=compression_specification_file)
+        assert encoding.variable_encodings["default"].to_string() == "lossy,zfp,rate,4.0"
+
+        # Once the file changes, the new specification has to be used, even if it has the same size.
+        size = compression_specification_file.stat().st_size
+        compression_specification_file.write_text(yaml.dump({"default": "lossy,sz,abs,0.1"}, Dumper=YAML_DUMPER))
+        assert compression_specification_file.stat().st_size == size
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression=compression_specification_file)
+        assert encoding.variable_encodings["default"].to_string() == "lossy,sz,abs,0.1"
+
+    @pytest.mark.parametrize("content", ["", "lossless\n"])
+    def test_get_a_single_compression_string_wrong_file(self, tmp_path, content) -> None:
+        compression_specification_file = tmp_path / "compression_specification.yaml"
+        compression_specification_file.write_text(content)
+        with pytest.raises(InvalidCompressionSpecification):
+            DatasetEncoding.get_a_single_compression_string(compression_specification_file)
 
-    def test_DatasetEncoding_wrong_type(self) -> None:
-        import os
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    @pytest.mark.parametrize("content", ["", "{}\n"])
+    def test_DatasetEncoding_empty_file(self, dummy_dataset, tmp_path, content) -> None:
+        from enstools.encoding.dataset_encoding import parse_specification_dictionary
+        compression_specification_file = tmp_path / "compression_specification.yaml"
+        compression_specification_file.write_text(content)
         with pytest.raises(InvalidCompressionSpecification):
-            encoding = DatasetEncoding(dataset=dataset, compression=42)  # noqa
+            DatasetEncoding(dummy_dataset, compression_specification_file)
+        with pytest.raises(InvalidCompressionSpecification):
+            parse_specification_dictionary(None)
 
-    def test_DatasetEncoding_wrong_file(self) -> None:
-        import os
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_wrong_type(self, dummy_dataset) -> None:
         with pytest.raises(InvalidCompressionSpecification):
-            encoding = DatasetEncoding(dataset=dataset, compression="non-existing")  # noqa
+            encoding = DatasetEncoding(dataset=dummy_dataset, compression=42)  # noqa
 
-    def test_DatasetEncoding_encoding(self) -> None:
-        import os
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_wrong_file(self, dummy_dataset) -> None:
+        with pytest.raises(InvalidCompressionSpecification):
+            encoding = DatasetEncoding(dataset=dummy_dataset, compression="non-existing")  # noqa
 
-        encoding = DatasetEncoding(dataset=dataset, compression="lossless")  # noqa
+    def test_DatasetEncoding_encoding(self, dummy_dataset) -> None:
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression="lossless")  # noqa
         # Try encoding method.
         encoding.encoding()
 
-    def test_DatasetEncoding_addMetadata(self) -> None:
-        import os
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_addMetadata(self, dummy_dataset) -> None:
+        dataset = dummy_dataset.copy()
 
         encoding = DatasetEncoding(dataset=dataset, compression="lossless")  # noqa
         # Try add_metadata method.
         encoding.add_metadata()
 
-    def test_DatasetEncoding_Mapping(self) -> None:
-        import os
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-
-        encoding = DatasetEncoding(dataset=dataset, compression="lossless")  # noqa
+    def test_DatasetEncoding_Mapping(self, dummy_dataset) -> None:
+        encoding = DatasetEncoding(dataset=dummy_dataset, compression="lossless")  # noqa
         dict(encoding)
         len(encoding)
         encoding["dummy"] = None
 
+    def test_DatasetEncoding_invalidate(self, dummy_dataset) -> None:
+        dataset = dummy_dataset.copy()
+
+        encoding = DatasetEncoding(dataset=dataset, compression="lossless")
+        assert encoding["temperature"] is encoding["temperature"]
+        dataset["humidity"] = dataset["temperature"]
+        assert "humidity" not in encoding
+        encoding.invalidate()
+        assert "humidity" in encoding
+
     def test_FilterEncodingForH5py(self):
         from enstools.encoding.variable_encoding import get_variable_encoding
         _ = get_variable_encoding("lossy,zfp,rate,0.4")
 
     def test_FilterEncodingForH5py_from_string_none(self):
-
         _ = VariableEncoding("none")
         _ = VariableEncoding(None)
         _ = VariableEncoding("None")
@@ -104,20 +268,44 @@ class TestEncoding:
         with pytest.raises(InvalidCompressionSpecification):
             _ = VariableEncoding("lossy,wrong,mode,0.1")
 
-    def test_FilterEncodingForH5py_wrong_specification(self):
-        # Different cases that should raise a wrong specification error.
-        cases = [
-            "poijasduiohqwoir",
-            "lossly",
-            "random",
-            "zfp,rate,2",
-            "lossy,",
-            "lossy:zfp:rate:1",
-        ]
-
-        for case in cases:
-            with pytest.raises(InvalidCompressionSpecification):
-                _ = VariableEncoding(case)
+    @pytest.mark.parametrize("case", WRONG_VARIABLE_SPECIFICATIONS)
+    def test_FilterEncodingForH5py_wrong_specification(self, case):
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding(case)
+
+    def test_lossy_compression_modes(self):
+        from enstools.encoding.api import lossy_compression_modes, lossy_compressors_and_modes
+        assert lossy_compression_modes["zfp"] == ["rate", "precision", "accuracy"]
+        assert all(lossy_compression_modes[c] == list(modes) for c, modes in lossy_compressors_and_modes.items())
+
+    def test_FilterEncodingForH5py_wrong_parameter(self):
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding(compressor="zfp", mode="rate", parameter="wrong")
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding(compressor="zfp", mode="rate", parameter=None)
+        assert VariableEncoding(compressor="zfp", mode="rate", parameter="4").parameter == 4.0
+
+    def test_FilterEncodingForH5py_multiple_options(self):
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding("lossless", backend="lz4")
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding(compressor="zfp", mode="rate", parameter=4, backend="lz4")
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding("lossless", shuffle="bitshuffle")
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding(compressor="zfp", mode="rate", parameter=4, shuffle="bitshuffle")
+        assert VariableEncoding(backend="lz4").to_string() == "lossless,lz4,5"
+
+    def test_FilterEncodingForH5py_lossless_shuffle(self):
+        assert VariableEncoding("lossless,zstd,5")["compression_opts"] == \
+            tuple(hdf5plugin.Blosc(cname="zstd", clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE)["compression_opts"])
+        h5encoding = VariableEncoding("lossless,zstd,5,bitshuffle")
+        assert h5encoding.to_string() == "lossless,zstd,5,bitshuffle"
+        assert h5encoding["compression_opts"] == \
+            tuple(hdf5plugin.Blosc(cname="zstd", clevel=5, shuffle=hdf5plugin.Blosc.BITSHUFFLE)["compression_opts"])
+        assert VariableEncoding(backend="zstd", shuffle="bitshuffle").to_string() == "lossless,zstd,5,bitshuffle"
+        with pytest.raises(InvalidCompressionSpecification):
+            _ = VariableEncoding("lossless,zstd,5,wrong")
 
     def test_FilterEncodingForH5py_object_to_string(self):
         h5encoding = VariableEncoding("lossy,zfp,rate,5.0")
@@ -127,198 +315,236 @@ class TestEncoding:
         h5encoding = VariableEncoding("lossy,zfp,rate,5.0")
         h5encoding.description()
 
-    def test_long_list_of_cases(self):
+    def test_Encoding_clone(self):
+        h5encoding = VariableEncoding("lossy,zfp,rate,5.0")
+        clone = h5encoding.clone()
+        clone.set_chunk_sizes((1, 2, 3))
+        assert clone.to_string() == h5encoding.to_string()
+        assert "chunksizes" not in h5encoding
+
+    def test_Encoding_clone_is_independent(self):
+        # clone() only copies the encoding dictionary, which is safe as long as its values are immutable.
+        for specification in ["lossless", "lossy,zfp,rate,4", "lossy,sz,abs,0.1", "none"]:
+            h5encoding = VariableEncoding(specification)
+            for value in h5encoding.values():
+                hash(value)
+            clone = h5encoding.clone()
+            assert dict(clone) == dict(h5encoding)
+            assert clone._kwargs is not h5encoding._kwargs
+
+    def test_Encoding_lazy_mapping(self):
+        from enstools.encoding.variable_encoding import LossyEncoding
+        h5encoding = LossyEncoding("zfp", "rate", 4)
+        assert h5encoding.to_string() == "lossy,zfp,rate,4.0"
+        # The filter is not built until the encoding is used as a mapping
+        with pytest.raises(AttributeError):
+            object.__getattribute__(h5encoding, "_kwargs")
+        assert dict(h5encoding) == dict(hdf5plugin.Zfp(rate=4))
+        assert object.__getattribute__(h5encoding, "_kwargs") == dict(hdf5plugin.Zfp(rate=4))
+
+    def test_Encoding_mapping_methods(self):
+        from collections.abc import Mapping
+        h5encoding = VariableEncoding("lossless")
+        h5encoding.set_chunk_sizes((1, 2, 3))
+        assert isinstance(h5encoding, Mapping)
+        assert "chunksizes" in h5encoding
+        assert "missing" not in h5encoding
+        assert h5encoding.get("chunksizes") == (1, 2, 3)
+        assert h5encoding.get("missing", 0) == 0
+        assert dict(h5encoding.items()) == dict(zip(h5encoding.keys(), h5encoding.values())) == dict(h5encoding)
+
+    def test_Encoding_copy_and_pickle(self):
+        # Encodings use __slots__, check that they can still be copied and pickled.
+        import copy
+        import pickle
+        for specification in ["lossless", "lossy,zfp,rate,4", "none"]:
+            h5encoding = VariableEncoding(specification)
+            h5encoding.set_chunk_sizes((1, 2, 3))
+            assert not hasattr(h5encoding, "__dict__")
+            for other in (copy.deepcopy(h5encoding), pickle.loads(pickle.dumps(h5encoding))):
+                assert type(other) is type(h5encoding)
+                assert other.to_string() == h5encoding.to_string()
+                assert dict(other) == dict(h5encoding)
+
+    def test_parse_full_specification_cached_copies(self):
+        from enstools.encoding.dataset_encoding import parse_full_specification
+        specification = "lossy,zfp,rate,4 temperature:lossless"
+        first = parse_full_specification(specification)
+        second = parse_full_specification(specification)
+        assert first.keys() == second.keys()
+        for key in first:
+            assert first[key] is not second[key]
+            assert first[key].to_string() == second[key].to_string()
+
+    def test_parse_variable_specification_cached_copies(self):
+        from enstools.encoding.variable_encoding import parse_variable_specification
+        first = parse_variable_specification("lossy,sz,abs,0.1")
+        first.set_chunk_sizes((1, 2))
+        second = parse_variable_specification("lossy,sz,abs,0.1")
+        assert first is not second
+        assert "chunksizes" not in second
+        assert first.to_string() == second.to_string()
+
+    def test_chunk_sizes_in_dim_order(self, dummy_dataset):
+        from enstools.encoding.dataset_encoding import chunk_sizes_in_dim_order, find_chunk_sizes
+        assert chunk_sizes_in_dim_order(("lat", "time"), (100, 10), 100) == (100, 1)
+        assert chunk_sizes_in_dim_order(("lat", "lon"), (100, 20), 40) == (33, 1)
+        assert chunk_sizes_in_dim_order(("lat",), (100000,), 1, max_chunks_per_dim=10) == (10000,)
+        dataset = dummy_dataset[["temperature"]]
+        data_array = dataset["temperature"]
+        chunk_sizes = find_chunk_sizes(data_array, 1000)
+        assert tuple(chunk_sizes[d] for d in data_array.dims) == \
+            chunk_sizes_in_dim_order(data_array.dims, data_array.shape, 1000)
+
+    @pytest.mark.parametrize("shape", [(2, 2, 8, 4), (5, 31, 360, 91), (24, 31, 360, 181)])
+    def test_DatasetEncoding_default_chunks(self, shape):
+        # A zero-stride view keeps realistic shapes free, the encoding never reads the values
+        data = np.broadcast_to(np.float32(0.0), shape)
+        dataset = xr.Dataset({"temperature": (("time", "level", "lon", "lat"), data)})
+        chunk_sizes = DatasetEncoding(dataset, "lossless")["temperature"]["chunksizes"]
+        assert all(1 <= chunk <= size for chunk, size in zip(chunk_sizes, shape))
+        # The number of chunks is rounded down, so chunks are below twice the 16MB target
+        assert 4 * np.prod(chunk_sizes) < 2 * 16 * 1024 ** 2
+
+    @pytest.mark.parametrize("module", ["enstools.encoding.api", "enstools.encoding.variable_encoding"])
+    def test_import_registers_filters(self, module):
+        # Reading compressed files relies on importing the package registering the hdf5plugin filters in HDF5.
+        # Unpickling an encoding (e.g. in a dask worker) only imports variable_encoding.
+        import subprocess
+        import sys
+        from pathlib import Path
+        code = f"import {module}, h5py, sys; sys.exit(not h5py.h5z.filter_avail(32001))"
+        repository = Path(__file__).resolve().parents[1]
+        assert subprocess.run([sys.executable, "-c", code], cwd=repository, check=False).returncode == 0
+
+    def test_set_blosc_nthreads(self, monkeypatch):
+        from enstools.encoding.api import set_blosc_nthreads
+        monkeypatch.delenv("BLOSC_NTHREADS", raising=False)
+        set_blosc_nthreads(2)
+        assert os.environ["BLOSC_NTHREADS"] == "2"
+
+    def test_convert_size(self):
+        from enstools.encoding.dataset_encoding import convert_size
+        assert convert_size(0) == "0B"
+        assert convert_size(0.5) == "0.5B"
+        assert convert_size(-2048) == "-2.0KB"
+        assert convert_size(16 * 1024 ** 2) == "16.0MB"
+
+    def test_netcdf4_chunk_sizes(self):
+        from enstools.encoding.dataset_encoding import netcdf4_chunk_sizes
+        dims, shape = ("time", "level", "lon", "lat"), (5, 31, 360, 91)
+        chunk_sizes = netcdf4_chunk_sizes(dims, shape, 4, 1024 ** 2, unlimited_dims=("time",))
+        assert chunk_sizes[0] == 1
+        assert 16 * 1024 <= 4 * np.prod(chunk_sizes) <= 1024 ** 2
+        # Small variables are kept in a single chunk
+        assert netcdf4_chunk_sizes(("lat",), (100,), 4, 1024 ** 2) == (100,)
+
+    def test_netcdf4_chunk_strategy(self):
+        from enstools.encoding.dataset_encoding import netcdf4_chunk_strategy
+        dataset = xr.Dataset({"var": (("time", "lat", "lon"), np.zeros((3, 1000, 1000), dtype="float32"))})
+        encoding = DatasetEncoding(dataset, "lossless", chunk_strategy=netcdf4_chunk_strategy)
+        chunk_sizes = encoding["var"]["chunksizes"]
+        assert chunk_sizes[0] == 1
+        assert 16 * 1024 <= 4 * chunk_sizes[1] * chunk_sizes[2] <= 1024 ** 2
+
+    def test_netcdf4_chunk_strategy_unlimited_dims(self):
+        import functools
+        from enstools.encoding.dataset_encoding import netcdf4_chunk_strategy
+        dataset = xr.Dataset({"var": (("member", "lat", "lon"), np.zeros((3, 100, 100), dtype="float32"))})
+        dataset.encoding["unlimited_dims"] = {"member"}
+        strategy = functools.partial(netcdf4_chunk_strategy, unlimited_dims=dataset.encoding["unlimited_dims"])
+        assert DatasetEncoding(dataset, "lossless", chunk_strategy=strategy)["var"]["chunksizes"] == (1, 100, 100)
+
+    @pytest.mark.parametrize("case, valid", LONG_LIST_OF_CASES)
+    def test_long_list_of_cases(self, dummy_dataset, case, valid):
         """
         Test a long list of valid and invalid cases.
-        It contains a list of tuples with the specification and its validity.
+        Each case is a tuple with the specification and its validity.
         In case it is not a valid string, it should raise an exception.
         """
-
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-
-        cases = [
-            ("lossless", True),
-            ("lossy,lossless", False),
-            ("lossless,lz4,5", True),
-            ("lossy,zfp,rate,4.0,precision", False),
-            ("lossy,sz,abs,0.01", True),
-            ("lossy,sz,mode,0.01", False),
-            ("lossy,sz3,abs,0.01", True),
-            ("var1:lossless var2:lossy,sz,rel,1e-3", True),
-            ("var1:lossless var2:lossy,sz,rel,1e-3,pw", False),
-            ("default:lossless,lz4,3 var1:lossy,zfp,rate,4.0", True),
-            ("default:lossless,lz4,3 var1:lossy,zfp,rate,4.0,precision", False),
-            ("lossless,snappy", True),
-            ("lossless,snapp", False),
-            ("lossless,snappy,5", True),
-            ("lossless,snappy,0", False),
-            ("lossless,snappy,11", False),
-            ("lossy,zfp,accuracy,0.01", True),
-            ("lossy,zfp,accurancy,0.01", False),
-            ("lossy,zfp,accurancy,0.01", False),
-            ("lossy,sz,pw_rel,0.05", True),
-            ("lossy,sz,pw_rel,-0.05", False),
-            ("lossy,sz,pw_rel,0", False),
-            ("lossy,sz,pw_rel,1", False),
-            ("var1:lossless var2:lossy,sz,abs,0.1", True),
-            ("var1:lossless var2:lossy,sz,abs,-0.1", False),
-            ("var1:lossless var2:lossy,sz,abs,2", True),
-            ("default:lossy,zfp,rate,4.0 var1:lossless", True),
-            ("default:lossy,zfp,rate,4.0 var1:lossless,lz4", True),
-            ("default:lossy,zfp,rate,4.0 var1:lossless,lz4,5", True),
-            ("default:lossy,zfp,rate,4.0 var1:lossless,lz4,0", False),
-            ("default:lossy,zfp,rate,4.0 var1:lossless,lz4,11", False),
-            ("lossless,zstd", True),
-            ("lossless,zst", False),
-            ("lossless,zstd,5", True),
-            ("lossless,zstd,0", False),
-            ("lossless,zstd,11", False),
-            ("lossy,zfp,precision,13", True),
-            ("lossy,zfp,precission,13", False),
-            ("lossy,zfp,precision,13,rate", False),
-            ("lossy,zfp,precision,-13", False),
-            ("var1:lossless var2:lossy,zfp,accuracy,0.01", True),
-            ("var1:lossless var2:lossy,zfp,accurancy,0.01", False),
-            ("default:lossless var1:lossy,zfp,rate,4.0", True),
-            ("default:lossless,zlib var1:lossy,zfp,rate,4.0", True),
-            # Some tricky cases
-            ("lossless,lz4,2 default:lossy,zfp,rate,3", False),
-            ("lossless,lz4,2 var1:lossy,zfp,rate,3 var2:lossless", True),
-            ("lossless,lz4,2 var1:lossy,zfp,rate,3 var2:lossless,lz4hc,4", True),
-            ("lossless,lz4,2 var1:lossy,zfp,rate,30 var2:lossless,lz4hc,4", True),
-            ("lossy,sz,pw_rel,1e-2", True),
-            ("lossy,sz,pw_rel,1e-20", True),
-            ("lossy,sz,abs,1e-20", True),
-            ("lossy,sz,abs,-1e-2", False),
-            ("lossy,sz,abs,1", True),
-            ("default:lossy,sz,abs,1 lossless,lz4,3", False),
-            ("lossy,sz,abs,1 lossless,lz4,3", False),
-            ("lossy,zfp,rate,3 lossy,sz,abs,1", False),
-            ("default:lossy,zfp,rate,3 default:lossy,sz,abs,1", False),
-            ("lossy,zfp,rate,3 var1:lossy,sz,abs,1", True),
-            ("lossy,zfp,rate,3 lossless,lz4,3", False),
-            ("lossy,zfp,rate,3 var1:lossless,lz4,3", True),
-            # More tricky cases
-            ("lossless,lz4,3 lossless,lz4hc,3", False),  # Two default values provided
-            ("lossless,lz4,3 lossy,zfp,rate,4.0 lossless,snappy,9", False),  # Two default values provided
-            ("var1:lossless,lz4,3 var2:lossy,zfp,rate,4.0 var1:lossless,snappy,9", False),  # var1 specified twice
-            ("lossy,zfp,precision,0.5", False),  # precision expects an integer
-            ("lossy,zfp,precision,32.5", False),  # precision expects an integer
-            ("lossy,zfp,rate,-0.5", False),  # Rate should be positive
-            ("lossy,zfp,rate,32.5", False),  # Rate should be between 0 and 32
-            ("lossy,sz,pw_rel,1.5 lossy,sz,pw_rel,1.5", False),  # Two default values provided
-            ("lossy,zfp,abs,1.5", False),  # abs is not a valid mode for zfp
-            ("lossy,sz,abs,1.5 lossless,zfp,3", False),
-            (None, True),  # None should be a possibility
-            ("None", True),  # None should be a possibility, also provided as a string
-            ("none", True),  # None should be a possibility, also provided as a string
-        ]
-
-        for case, valid in cases:
-            if valid:
-                DatasetEncoding(dataset=dataset, compression=case)
-            else:
-                with pytest.raises(Exception):
-                    DatasetEncoding(dataset=dataset, compression=case)
+        if valid:
+            DatasetEncoding(dataset=dummy_dataset, compression=case)
+        else:
+            with pytest.raises(InvalidCompressionSpecification):
+                DatasetEncoding(dataset=dummy_dataset, compression=case)
 
 
 class TestZFPEncoding:
-    def test_DatasetEncoding_zfp_accuracy(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,zfp,accuracy,0.1")
+    def test_DatasetEncoding_zfp_accuracy(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,zfp,accuracy,0.1")
 
-    def test_DatasetEncoding_zfp_rate(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,zfp,rate,3.2")
+    def test_DatasetEncoding_zfp_rate(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,zfp,rate,3.2")
 
-    def test_DatasetEncoding_zfp_precision(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,zfp,precision,10")
+    def test_DatasetEncoding_zfp_precision(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,zfp,precision,10")
 
-    def test_DatasetEncoding_zfp_wrongMode(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_zfp_wrongMode(self, dummy_dataset) -> None:
         with pytest.raises(InvalidCompressionSpecification):
-            DatasetEncoding(dataset, "lossy,zfp,wrong,10")
+            DatasetEncoding(dummy_dataset, "lossy,zfp,wrong,10")
 
 
 class TestSZEncoding:
-    def test_DatasetEncoding_sz_abs(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,sz,abs,0.1")
+    def test_DatasetEncoding_sz_abs(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,sz,abs,0.1")
 
-    def test_DatasetEncoding_sz_rel(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,sz,rel,0.001")
+    def test_DatasetEncoding_sz_rel(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,sz,rel,0.001")
 
-    def test_DatasetEncoding_sz_pwrel(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,sz,pw_rel,0.001")
+    def test_DatasetEncoding_sz_pwrel(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,sz,pw_rel,0.001")
 
-    def test_DatasetEncoding_sz_wrongMode(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_sz_wrongMode(self, dummy_dataset) -> None:
         with pytest.raises(InvalidCompressionSpecification):
-            DatasetEncoding(dataset, "lossy,sz,wrong,10")
+            DatasetEncoding(dummy_dataset, "lossy,sz,wrong,10")
 
-    def test_DatasetEncoding_sz_wrongParameter(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_sz_wrongParameter(self, dummy_dataset) -> None:
         with pytest.raises(InvalidCompressionSpecification):
-            DatasetEncoding(dataset, "lossy,sz,abs,wrong")
+            DatasetEncoding(dummy_dataset, "lossy,sz,abs,wrong")
 
 
 @pytest.mark.skipif(not hasattr(hdf5plugin, "SZ3"), reason="hdf5plugin doesn't have SZ3")
 class TestSZ3Encoding:
-    def test_DatasetEncoding_sz3_abs(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,sz3,abs,0.1")
+    def test_DatasetEncoding_sz3_abs(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,sz3,abs,0.1")
 
-    def test_DatasetEncoding_sz3_rel(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,sz3,rel,0.001")
+    def test_DatasetEncoding_sz3_rel(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,sz3,rel,0.001")
 
-    def test_DatasetEncoding_sz3_psnr(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,sz3,psnr,60")
+    def test_DatasetEncoding_sz3_psnr(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,sz3,psnr,60")
 
-    def test_DatasetEncoding_sz3_norm2(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
-        DatasetEncoding(dataset, "lossy,sz3,norm2,0.01")
+    def test_DatasetEncoding_sz3_norm2(self, dummy_dataset) -> None:
+        DatasetEncoding(dummy_dataset, "lossy,sz3,norm2,0.01")
 
-    def test_DatasetEncoding_sz3_wrongMode(self) -> None:
-        # Create a dummy dataset with few variables
-        dataset = create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
+    def test_DatasetEncoding_sz3_wrongMode(self, dummy_dataset) -> None:
         with pytest.raises(InvalidCompressionSpecification):
-            DatasetEncoding(dataset, "lossy,sz3,wrong,10")
+            DatasetEncoding(dummy_dataset, "lossy,sz3,wrong,10")
+
+
+@pytest.fixture(scope="session")
+def dummy_dataset() -> xr.Dataset:
+    # The dataset is shared by all the tests, the ones that modify it have to work on a copy.
+    return create_dummy_xarray_dataset(variables=["temperature", "vorticity", "pressure"])
 
 
 def create_dummy_xarray_dataset(variables: list = None) -> xr.Dataset:
     # Create a synthetic dataset representing a 4D variable (3D + time)
     if variables is None:
         variables = ["temperature", "vorticity", "pressure"]
-    nx, ny, nz, t = 360, 91, 31, 5
+    # Small grid, the encodings only depend on the dimensions and data type
+    nx, ny, nz, t = 4, 4, 2, 2
     lon = np.linspace(-180, 180, nx)
     lat = np.linspace(-90, 90, ny)
-    levels = np.array(range(nz))
+    levels = np.arange(nz)
 
     data_size = (t, nz, nx, ny)
     var_dimensions = ["time", "level", "lon", "lat"]
 
     # Select data type
     data_type = np.float32
-    # Create some random data
-    var_data = data_type(15 + 8 * np.random.randn(*data_size))
+    # The values are never checked, only the dimensions, shape and data type matter
+    var_data = np.zeros(data_size, dtype=data_type)
 
     var_dict = {var: (var_dimensions, var_data) for var in variables}
 
@@ -329,8 +555,8 @@ def create_dummy_xarray_dataset(variables: list = None) -> xr.Dataset:
             "lon": lon,
             "lat": lat,
             "level": levels,
-            "time": pd.date_range("2014-09-06", periods=t),
-            "reference_time": pd.Timestamp("2014-09-05"),
+            "time": np.datetime64("2014-09-06") + np.arange(t).astype("timedelta64[D]"),
+            "reference_time": np.datetime64("2014-09-05"),
         },
     )
     return ds